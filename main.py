@@ -1,14 +1,52 @@
 # =========================================
 # Enhanced Player Server with Shared Markers/Pings + Chat
 # =========================================
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from collections import defaultdict
+from functools import lru_cache
+from queue import SimpleQueue
+from typing import Annotated
 import asyncio
+import logging
+import logging.handlers
+import os
+import re
+import secrets
+import sys
 import time
-import uuid
 
-app = FastAPI()
+import msgspec
+import numpy as np
+import orjson
+import xxhash
+
+# Log records are only enqueued on the event loop; a QueueListener thread
+# does the actual stdout writes
+log_queue = SimpleQueue()
+logger = logging.getLogger("server")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+logger.propagate = False
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson instead of the stdlib json module"""
+
+    def render(self, content) -> bytes:
+        try:
+            return orjson.dumps(
+                content,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder handles
+            return super().render(content)
+
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Allow all origins
 app.add_middleware(
@@ -19,21 +57,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Player storage
-# username -> dict(level=str, coords=dict, frequency=float, last_update=float)
-players = {}
-
-# Shared markers storage
-# marker_id -> dict(
-#     username=str, 
-#     frequency=float, 
-#     level=str, 
-#     coords=dict, 
-#     marker_type=str, 
-#     timestamp=float,
-#     expires_at=float or None
-# )
-shared_markers = {}
+# All state below lives in this process, so the server runs as a single
+# worker (--workers 1 in the Procfile); more workers would each see a
+# different world.
+
+# Player storage, one dict per field so scans only touch the field they need
+player_level = {}        # username -> str
+player_coords = {}       # username -> dict
+player_freq = {}         # username -> float
+player_last_update = {}  # username -> float
+player_fingerprint = {}  # username -> int hash of (level, coords, frequency)
+player_timer = {}        # username -> asyncio.TimerHandle for inactivity
+
+# Shared markers storage, one row per marker. The numeric fields are packed
+# into a numpy structured array (24 bytes per marker): the expiry column
+# doubles as the live-row mask behind the unfiltered /markers/get, the /ws
+# snapshot and compaction. Strings and coords are parallel lists indexed by
+# the same row.
+# Expiry is +inf for markers that never expire and -inf for deleted rows.
+MARKER_DTYPE = np.dtype([
+    ("freq", "f8"),
+    ("exp", "f8"),
+    ("ts", "f8"),
+])
+markers_arr = np.zeros(1024, dtype=MARKER_DTYPE)
+markers_arr["exp"] = -np.inf
+marker_ids = []       # row -> marker_id, None once deleted
+marker_username = []  # row -> str
+marker_level = []     # row -> str
+marker_types = []     # row -> marker_type str
+marker_coords = []    # row -> dict
+marker_row = {}       # marker_id -> row
+marker_dead_rows = 0
+
+MARKER_COMPACT_MIN = 256  # deleted rows tolerated before compacting
+
+# Inverted indexes over live markers so filtered lookups only touch matches
+markers_by_key = defaultdict(set)    # (frequency, level) -> set of marker_id
+markers_by_freq = defaultdict(set)   # frequency -> set of marker_id
+markers_by_level = defaultdict(set)  # level -> set of marker_id
+
+# Expiry timers for markers that have an expires_at
+marker_timer = {}  # marker_id -> asyncio.TimerHandle
 
 # Chat messages storage
 # message_id -> dict(
@@ -45,20 +110,276 @@ shared_markers = {}
 # )
 chat_messages = {}
 
+# Serialized response caches, dropped whenever the state behind them changes
+players_cache = None  # body of the last /players response
+markers_cache = {}    # (frequency, level) -> body of the last /markers/get response
+MARKERS_CACHE_MAX = 256
+
+# Versions behind the ETags of /players and /markers/get. The epoch keeps
+# tags from a previous process from matching after a restart.
+ETAG_EPOCH = secrets.token_hex(4)
+players_version = 0
+markers_version = 0
+
 INACTIVITY_TIMEOUT = 5 * 60  # 5 minutes
 MARKER_EXPIRY = 30 * 60  # 30 minutes for markers
 CHAT_EXPIRY = 5 * 60  # 5 minutes for chat messages
 
+# WebSocket subscribers, each with its own outbound queue of encoded deltas.
+# A subscriber whose queue fills up is dropped rather than stalling writers.
+subscribers = {}  # WebSocket -> asyncio.Queue of bytes (None = disconnect)
+SUBSCRIBER_QUEUE_MAX = 1000
+
+# Random ids are carved out of one os.urandom() buffer, 16 bytes at a time
+ID_BYTES = 16
+ID_BUFFER_SIZE = 256 * ID_BYTES
+id_buffer = b""
+id_offset = 0
+
+# Wall clock refreshed by tick_clock() instead of calling time.time() per
+# request; up to CLOCK_INTERVAL stale, which is fine for expiry bookkeeping
+CLOCK_INTERVAL = 0.1
+cached_time = time.time()
+
+# Request bodies, decoded and validated by msgspec in a single pass.
+# Handlers sys.intern() the repeated string fields (username, level,
+# marker_type) so every record shares one str object per distinct value.
+NonEmptyStr = Annotated[str, msgspec.Meta(min_length=1)]
+NonEmptyDict = Annotated[dict, msgspec.Meta(min_length=1)]
+
+class JoinReq(msgspec.Struct):
+    username: NonEmptyStr
+    level: NonEmptyStr
+    coords: NonEmptyDict
+    frequency: float
+
+class MarkerReq(msgspec.Struct):
+    username: NonEmptyStr
+    frequency: float
+    level: NonEmptyStr
+    coords: NonEmptyDict
+    marker_type: NonEmptyStr
+    expires_in: float | None = MARKER_EXPIRY
+
+# Response bodies for /players and /markers/get, encoded by msgspec
+class PlayerRec(msgspec.Struct):
+    level: str
+    coords: dict
+    frequency: float
+    last_update: float
+
+class PlayersResp(msgspec.Struct):
+    players: dict[str, PlayerRec]
+
+class MarkerRec(msgspec.Struct):
+    username: str
+    frequency: float
+    level: str
+    coords: dict
+    marker_type: str
+    timestamp: float
+    expires_at: float | None
+
+class MarkersResp(msgspec.Struct):
+    markers: dict[str, MarkerRec]
+
+json_encoder = msgspec.json.Encoder()
+# Key-sorted so equal coords always hash the same; unlike orjson it also
+# accepts integers beyond 64 bits, which msgspec happily decodes
+fingerprint_encoder = msgspec.json.Encoder(order="sorted")
+
+def new_id():
+    """Random 32-char hex id for markers and chat messages"""
+    global id_buffer, id_offset
+    if id_offset == len(id_buffer):
+        id_buffer = os.urandom(ID_BUFFER_SIZE)
+        id_offset = 0
+    start = id_offset
+    id_offset += ID_BYTES
+    return id_buffer[start:id_offset].hex()
+
+def publish(event):
+    """Encode a delta once and queue it for every WebSocket subscriber"""
+    if not subscribers:
+        return
+    payload = json_encoder.encode(event)
+    for websocket, queue in list(subscribers.items()):
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            del subscribers[websocket]
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+def players_changed():
+    global players_cache, players_version
+    players_cache = None
+    players_version += 1
+
+def markers_changed():
+    global markers_version
+    markers_cache.clear()
+    markers_version += 1
+
+def cached_json_response(request, version, body_factory):
+    """Answer 304 when the client already holds this version, else the body"""
+    etag = f'W/"{ETAG_EPOCH}-{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body_factory(), media_type="application/json", headers={"ETag": etag})
+
+def player_fingerprint_of(level, coords, frequency):
+    """64-bit hash of a player's position, so keepalives compare one int"""
+    return xxhash.xxh3_64_intdigest(
+        fingerprint_encoder.encode((level, coords, frequency))
+    )
+
+def player_record(username):
+    """Rebuild the per-player record returned by the API"""
+    return PlayerRec(
+        player_level[username],
+        player_coords[username],
+        player_freq[username],
+        player_last_update[username]
+    )
+
+def marker_record(row):
+    """Rebuild the per-marker record returned by the API"""
+    packed = markers_arr[row]
+    expires_at = float(packed["exp"])
+    return MarkerRec(
+        marker_username[row],
+        float(packed["freq"]),
+        marker_level[row],
+        marker_coords[row],
+        marker_types[row],
+        float(packed["ts"]),
+        expires_at if expires_at != np.inf else None
+    )
+
+def live_marker_mask():
+    """Boolean mask over the used rows, True for markers not yet deleted"""
+    return markers_arr["exp"][:len(marker_ids)] != -np.inf
+
+def add_marker(marker_id, username, frequency, level, coords, marker_type, timestamp, expires_at):
+    global markers_arr
+    row = len(marker_ids)
+    if row == len(markers_arr):
+        grown = np.zeros(2 * row, dtype=MARKER_DTYPE)
+        grown["exp"] = -np.inf
+        grown[:row] = markers_arr
+        markers_arr = grown
+    
+    markers_arr[row] = (
+        frequency,
+        np.inf if expires_at is None else expires_at,
+        timestamp
+    )
+    marker_ids.append(marker_id)
+    marker_username.append(username)
+    marker_level.append(level)
+    marker_types.append(marker_type)
+    marker_coords.append(coords)
+    marker_row[marker_id] = row
+    markers_changed()
+    
+    markers_by_key[(frequency, level)].add(marker_id)
+    markers_by_freq[frequency].add(marker_id)
+    markers_by_level[level].add(marker_id)
+    if subscribers:
+        publish({"op": "marker_upsert", "marker_id": marker_id, "record": marker_record(row)})
+
+def delete_player(username):
+    players_changed()
+    del player_level[username]
+    del player_coords[username]
+    del player_freq[username]
+    del player_last_update[username]
+    del player_fingerprint[username]
+    del player_timer[username]
+    publish({"op": "remove", "username": username})
+
+def unindex_marker(index, key, marker_id):
+    ids = index[key]
+    ids.discard(marker_id)
+    if not ids:
+        del index[key]
+
+def delete_marker(marker_id):
+    global marker_dead_rows
+    row = marker_row.pop(marker_id)
+    markers_changed()
+    timer = marker_timer.pop(marker_id, None)
+    if timer is not None:
+        timer.cancel()
+    frequency = float(markers_arr["freq"][row])
+    level = marker_level[row]
+    unindex_marker(markers_by_key, (frequency, level), marker_id)
+    unindex_marker(markers_by_freq, frequency, marker_id)
+    unindex_marker(markers_by_level, level, marker_id)
+    publish({"op": "marker_remove", "marker_id": marker_id})
+    
+    markers_arr["exp"][row] = -np.inf
+    marker_ids[row] = None
+    marker_username[row] = None
+    marker_level[row] = None
+    marker_types[row] = None
+    marker_coords[row] = None
+    
+    marker_dead_rows += 1
+    if marker_dead_rows > MARKER_COMPACT_MIN and marker_dead_rows * 2 > len(marker_ids):
+        compact_markers()
+
+def compact_markers():
+    """Drop deleted rows, keeping the survivors in insertion order"""
+    global marker_dead_rows
+    keep = np.flatnonzero(live_marker_mask())
+    used = len(keep)
+    markers_arr[:used] = markers_arr[keep]
+    markers_arr["exp"][used:] = -np.inf
+    
+    for column in (marker_ids, marker_username, marker_level, marker_types, marker_coords):
+        column[:] = [column[row] for row in keep]
+    
+    marker_row.clear()
+    marker_row.update((marker_id, row) for row, marker_id in enumerate(marker_ids))
+    marker_dead_rows = 0
+
+# Expiry timer callbacks, scheduled with loop.call_later()
+def evict_player(username):
+    """Remove the player, or re-arm the timer if they pinged since it was set"""
+    remaining = player_last_update[username] + INACTIVITY_TIMEOUT - time.time()
+    if remaining > 0:
+        player_timer[username] = asyncio.get_running_loop().call_later(
+            remaining, evict_player, username
+        )
+        return
+    
+    delete_player(username)
+    logger.info("[CLEANUP] Removed inactive player: %s", username)
+
+def evict_marker(marker_id):
+    if marker_id in marker_row:
+        delete_marker(marker_id)
+        logger.info("[CLEANUP] Removed expired marker: %s", marker_id)
+
+def evict_chat(message_id):
+    if chat_messages.pop(message_id, None) is not None:
+        logger.info("[CLEANUP] Removed expired chat: %s", message_id)
+
+BROWSER_RE = re.compile(r"mozilla|chrome|safari|firefox|edge|opera|brave", re.IGNORECASE)
+PYTHON_RE = re.compile(r"python|requests|urllib", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def is_blocked_user_agent(user_agent):
+    """Clients resend the same user agent on every request, so cache the verdict"""
+    return bool(BROWSER_RE.search(user_agent)) and not PYTHON_RE.search(user_agent)
+
 # Middleware to block browsers
 @app.middleware("http")
 async def block_browsers(request: Request, call_next):
-    user_agent = request.headers.get("user-agent", "").lower()
-    
-    browser_keywords = ["mozilla", "chrome", "safari", "firefox", "edge", "opera", "brave"]
-    is_browser = any(browser in user_agent for browser in browser_keywords)
-    is_python = "python" in user_agent or "requests" in user_agent or "urllib" in user_agent
-    
-    if is_browser and not is_python:
+    if is_blocked_user_agent(request.headers.get("user-agent", "")):
         return JSONResponse(
             status_code=403,
             content={"error": "Browser access forbidden. API access only."}
@@ -78,45 +399,52 @@ async def join(request: Request):
         "frequency": 123.4
     }
     """
-    data = await request.json()
-    username = data.get("username")
-    level = data.get("level")
-    coords = data.get("coords")
-    frequency = data.get("frequency")
-    
-    if not all([username, level, coords, frequency is not None]):
-        return {"error": "Missing required fields"}
-    
-    current_time = time.time()
-    
-    if username in players:
-        old = players[username]
-        if (old["level"] == level and
-            old["coords"] == coords and
-            old["frequency"] == frequency):
-            players[username]["last_update"] = current_time
-            return {"message": "Updated timestamp", "status": "no_change"}
-        else:
-            players[username] = {
-                "level": level,
-                "coords": coords,
-                "frequency": frequency,
-                "last_update": current_time
-            }
-            return {"message": "Player updated", "status": "updated"}
+    try:
+        req = msgspec.json.decode(await request.body(), type=JoinReq)
+    except msgspec.DecodeError:
+        return ORJSONResponse({"error": "Missing required fields"})
+    username = sys.intern(req.username)
+    level = sys.intern(req.level)
+    coords = req.coords
+    frequency = req.frequency
+    
+    fingerprint = player_fingerprint_of(level, coords, frequency)
+    players_changed()  # last_update changes even when nothing else does
+    current_time = cached_time
+    
+    if username in player_last_update:
+        if player_fingerprint[username] == fingerprint:
+            player_last_update[username] = current_time
+            return ORJSONResponse({"message": "Updated timestamp", "status": "no_change"})
+        response = {"message": "Player updated", "status": "updated"}
     else:
-        players[username] = {
-            "level": level,
-            "coords": coords,
-            "frequency": frequency,
-            "last_update": current_time
-        }
-        return {"message": "Player joined", "status": "new"}
+        # Keepalives don't touch the timer; evict_player re-arms it instead
+        player_timer[username] = asyncio.get_running_loop().call_later(
+            INACTIVITY_TIMEOUT, evict_player, username
+        )
+        response = {"message": "Player joined", "status": "new"}
+    
+    player_level[username] = level
+    player_coords[username] = coords
+    player_freq[username] = frequency
+    player_last_update[username] = current_time
+    player_fingerprint[username] = fingerprint
+    if subscribers:
+        publish({"op": "upsert", "username": username, "record": player_record(username)})
+    return ORJSONResponse(response)
 
 @app.get("/players")
-async def get_players():
+async def get_players(request: Request):
     """Return all current players"""
-    return {"players": players}
+    return cached_json_response(request, players_version, players_body)
+
+def players_body():
+    global players_cache
+    if players_cache is None:
+        players_cache = json_encoder.encode(
+            PlayersResp({username: player_record(username) for username in player_last_update})
+        )
+    return players_cache
 
 @app.post("/markers/place")
 async def place_marker(request: Request):
@@ -131,64 +459,83 @@ async def place_marker(request: Request):
         "expires_in": 1800  # optional, seconds until expiry (default 30 min)
     }
     """
-    data = await request.json()
-    username = data.get("username")
-    frequency = data.get("frequency")
-    level = data.get("level")
-    coords = data.get("coords")
-    marker_type = data.get("marker_type")
-    expires_in = data.get("expires_in", MARKER_EXPIRY)
-    
-    if not all([username, frequency is not None, level, coords, marker_type]):
-        return {"error": "Missing required fields"}
-    
-    current_time = time.time()
-    marker_id = str(uuid.uuid4())
-    
-    shared_markers[marker_id] = {
-        "username": username,
-        "frequency": frequency,
-        "level": level,
-        "coords": coords,
-        "marker_type": marker_type,
-        "timestamp": current_time,
-        "expires_at": current_time + expires_in if expires_in else None
-    }
+    try:
+        req = msgspec.json.decode(await request.body(), type=MarkerReq)
+    except msgspec.DecodeError:
+        return ORJSONResponse({"error": "Missing required fields"})
+    username = sys.intern(req.username)
+    frequency = req.frequency
+    level = sys.intern(req.level)
+    coords = req.coords
+    marker_type = sys.intern(req.marker_type)
+    expires_in = req.expires_in
+    
+    current_time = cached_time
+    marker_id = new_id()
+    expires_at = current_time + expires_in if expires_in else None
+    
+    add_marker(
+        marker_id,
+        username,
+        frequency,
+        level,
+        coords,
+        marker_type,
+        current_time,
+        expires_at
+    )
+    
+    if expires_at is not None:
+        marker_timer[marker_id] = asyncio.get_running_loop().call_later(
+            expires_in, evict_marker, marker_id
+        )
     
-    print(f"[MARKER] {username} placed '{marker_type}' at {coords} on frequency {frequency}")
+    logger.info("[MARKER] %s placed '%s' at %s on frequency %s",
+                username, marker_type, coords, frequency)
     
-    return {
+    return ORJSONResponse({
         "message": "Marker placed",
         "marker_id": marker_id,
         "status": "success"
-    }
+    })
 
 @app.get("/markers/get")
-async def get_markers(frequency: float = None, level: str = None):
+async def get_markers(request: Request, frequency: float = None, level: str = None):
     """
     Get all markers, optionally filtered by frequency and level
     Query params: ?frequency=123.4&level=Level1
     """
-    current_time = time.time()
+    return cached_json_response(
+        request,
+        markers_version,
+        lambda: markers_body(frequency, level)
+    )
+
+def markers_body(frequency, level):
+    cache_key = (frequency, level or None)
+    if cache_key in markers_cache:
+        return markers_cache[cache_key]
+    
+    # Filtered queries read the matching ids straight from the indexes;
+    # expired markers are already gone, removed by their timers
+    if frequency is not None and level:
+        ids = markers_by_key.get((frequency, level), ())
+    elif frequency is not None:
+        ids = markers_by_freq.get(frequency, ())
+    elif level:
+        ids = markers_by_level.get(level, ())
+    else:
+        # Unfiltered: every live row
+        ids = [marker_ids[row] for row in np.flatnonzero(live_marker_mask()).tolist()]
     
-    # Filter markers
     filtered_markers = {}
-    for marker_id, marker in shared_markers.items():
-        # Check expiry
-        if marker["expires_at"] and current_time > marker["expires_at"]:
-            continue
-        
-        # Filter by frequency
-        if frequency is not None and marker["frequency"] != frequency:
-            continue
-        
-        # Filter by level
-        if level and marker["level"] != level:
-            continue
-        
-        filtered_markers[marker_id] = marker
+    for marker_id in ids:
+        filtered_markers[marker_id] = marker_record(marker_row[marker_id])
     
-    return {"markers": filtered_markers}
+    if len(markers_cache) >= MARKERS_CACHE_MAX:
+        markers_cache.clear()
+    body = markers_cache[cache_key] = json_encoder.encode(MarkersResp(filtered_markers))
+    return body
 
 @app.delete("/markers/remove/{marker_id}")
 async def remove_marker(marker_id: str, username: str = None):
@@ -196,19 +543,17 @@ async def remove_marker(marker_id: str, username: str = None):
     Remove a marker by ID
     Optional: username to verify ownership
     """
-    if marker_id not in shared_markers:
-        return {"error": "Marker not found", "status": "not_found"}
-    
-    marker = shared_markers[marker_id]
+    if marker_id not in marker_row:
+        return ORJSONResponse({"error": "Marker not found", "status": "not_found"})
     
     # If username provided, check ownership
-    if username and marker["username"] != username:
-        return {"error": "Not authorized to remove this marker", "status": "unauthorized"}
+    if username and marker_username[marker_row[marker_id]] != username:
+        return ORJSONResponse({"error": "Not authorized to remove this marker", "status": "unauthorized"})
     
-    del shared_markers[marker_id]
-    print(f"[MARKER] Removed marker {marker_id}")
+    delete_marker(marker_id)
+    logger.info("[MARKER] Removed marker %s", marker_id)
     
-    return {"message": "Marker removed", "status": "success"}
+    return ORJSONResponse({"message": "Marker removed", "status": "success"})
 
 @app.delete("/markers/clear")
 async def clear_markers(username: str = None, frequency: float = None):
@@ -217,21 +562,21 @@ async def clear_markers(username: str = None, frequency: float = None):
     Query params: ?username=Ethan or ?frequency=123.4
     """
     if not username and frequency is None:
-        return {"error": "Must provide username or frequency"}
+        return ORJSONResponse({"error": "Must provide username or frequency"})
     
-    to_remove = []
-    for marker_id, marker in shared_markers.items():
-        if username and marker["username"] == username:
-            to_remove.append(marker_id)
-        elif frequency is not None and marker["frequency"] == frequency:
-            to_remove.append(marker_id)
+    to_remove = set()
+    if username:
+        to_remove.update(marker_ids[row] for row, owner in enumerate(marker_username)
+                         if owner == username)
+    if frequency is not None:
+        to_remove.update(markers_by_freq.get(frequency, ()))
     
     for marker_id in to_remove:
-        del shared_markers[marker_id]
+        delete_marker(marker_id)
     
-    print(f"[MARKER] Cleared {len(to_remove)} markers")
+    logger.info("[MARKER] Cleared %d markers", len(to_remove))
     
-    return {"message": f"Cleared {len(to_remove)} markers", "status": "success"}
+    return ORJSONResponse({"message": f"Cleared {len(to_remove)} markers", "status": "success"})
 
 # ============= CHAT ENDPOINTS =============
 
@@ -257,8 +602,8 @@ async def send_chat(request: Request):
     if len(message) > 200:
         return {"error": "Message too long (max 200 characters)"}
     
-    current_time = time.time()
-    message_id = str(uuid.uuid4())
+    current_time = cached_time
+    message_id = new_id()
     
     chat_messages[message_id] = {
         "username": username,
@@ -268,7 +613,9 @@ async def send_chat(request: Request):
         "expires_at": current_time + CHAT_EXPIRY
     }
     
-    print(f"[CHAT] {username} (F:{frequency}): {message}")
+    asyncio.get_running_loop().call_later(CHAT_EXPIRY, evict_chat, message_id)
+    
+    logger.info("[CHAT] %s (F:%s): %s", username, frequency, message)
     
     return {
         "message": "Chat message sent",
@@ -282,7 +629,7 @@ async def get_chat(frequency: float = None):
     Get all chat messages, optionally filtered by frequency
     Query params: ?frequency=123.4
     """
-    current_time = time.time()
+    current_time = cached_time
     
     # Filter messages
     filtered_messages = {}
@@ -329,65 +676,107 @@ async def clear_chat(frequency: float = None):
     for message_id in to_remove:
         del chat_messages[message_id]
     
-    print(f"[CHAT] Cleared {len(to_remove)} messages")
+    logger.info("[CHAT] Cleared %d messages", len(to_remove))
     
     return {"message": f"Cleared {len(to_remove)} messages", "status": "success"}
 
-# Background task to remove inactive players, expired markers, and expired chat
-async def cleanup_inactive():
+# ============= LIVE UPDATES =============
+
+@app.websocket("/ws")
+async def live_updates(websocket: WebSocket):
+    """
+    Push player and marker changes instead of polling /players and /markers/get.
+    The first message is a full snapshot:
+    {"op": "snapshot", "players": {...}, "markers": {...}}
+    followed by deltas:
+    {"op": "upsert", "username": ..., "record": {...}}
+    {"op": "remove", "username": ...}
+    {"op": "marker_upsert", "marker_id": ..., "record": {...}}
+    {"op": "marker_remove", "marker_id": ...}
+    Keepalive joins that change nothing are not pushed.
+    """
+    # The http middleware never sees WebSocket handshakes, so block here too
+    if is_blocked_user_agent(websocket.headers.get("user-agent", "")):
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    
+    # Subscribe and take the snapshot without awaiting in between, so every
+    # delta queued from here on applies on top of the snapshot
+    queue = subscribers[websocket] = asyncio.Queue(SUBSCRIBER_QUEUE_MAX)
+    snapshot = json_encoder.encode({
+        "op": "snapshot",
+        "players": {username: player_record(username) for username in player_last_update},
+        "markers": {
+            marker_ids[row]: marker_record(row)
+            for row in np.flatnonzero(live_marker_mask()).tolist()
+        }
+    })
+    
+    # Read alongside sending so a client that goes away is unsubscribed right
+    # away, not on the next publish()
+    tasks = {
+        asyncio.create_task(send_deltas(websocket, queue, snapshot)),
+        asyncio.create_task(wait_for_disconnect(websocket))
+    }
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        subscribers.pop(websocket, None)
+        for task in tasks:
+            task.cancel()
+
+async def send_deltas(websocket, queue, snapshot):
+    await websocket.send_bytes(snapshot)
     while True:
-        now = time.time()
-        
-        # Remove inactive players
-        to_remove_players = []
-        for username, data in players.items():
-            if now - data["last_update"] > INACTIVITY_TIMEOUT:
-                to_remove_players.append(username)
-        
-        for username in to_remove_players:
-            del players[username]
-            print(f"[CLEANUP] Removed inactive player: {username}")
-        
-        # Remove expired markers
-        to_remove_markers = []
-        for marker_id, marker in shared_markers.items():
-            if marker["expires_at"] and now > marker["expires_at"]:
-                to_remove_markers.append(marker_id)
-        
-        for marker_id in to_remove_markers:
-            del shared_markers[marker_id]
-            print(f"[CLEANUP] Removed expired marker: {marker_id}")
-        
-        # Remove expired chat messages
-        to_remove_chat = []
-        for message_id, msg in chat_messages.items():
-            if now > msg["expires_at"]:
-                to_remove_chat.append(message_id)
-        
-        for message_id in to_remove_chat:
-            del chat_messages[message_id]
-            print(f"[CLEANUP] Removed expired chat: {message_id}")
-        
-        await asyncio.sleep(60)  # check every 60 seconds
+        payload = await queue.get()
+        if payload is None:
+            await websocket.close(code=1013)  # fell too far behind
+            return
+        await websocket.send_bytes(payload)
+
+async def wait_for_disconnect(websocket):
+    """Discard anything the client sends until it disconnects"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+async def tick_clock():
+    global cached_time
+    while True:
+        cached_time = time.time()
+        await asyncio.sleep(CLOCK_INTERVAL)
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(cleanup_inactive())
+    log_listener.start()
+    asyncio.create_task(tick_clock())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    log_listener.stop()
+
+ROOT_BODY = orjson.dumps({
+    "message": "Server running",
+    "note": "API access only - browsers blocked",
+    "endpoints": {
+        "players": "/players",
+        "join": "/join",
+        "place_marker": "/markers/place",
+        "get_markers": "/markers/get",
+        "remove_marker": "/markers/remove/{marker_id}",
+        "clear_markers": "/markers/clear",
+        "send_chat": "/chat/send",
+        "get_chat": "/chat/get",
+        "clear_chat": "/chat/clear",
+        "live_updates": "/ws"
+    }
+})
 
 @app.get("/")
 async def root():
-    return {
-        "message": "Server running", 
-        "note": "API access only - browsers blocked",
-        "endpoints": {
-            "players": "/players",
-            "join": "/join",
-            "place_marker": "/markers/place",
-            "get_markers": "/markers/get",
-            "remove_marker": "/markers/remove/{marker_id}",
-            "clear_markers": "/markers/clear",
-            "send_chat": "/chat/send",
-            "get_chat": "/chat/get",
-            "clear_chat": "/chat/clear"
-        }
-    }
+    return Response(ROOT_BODY, media_type="application/json")
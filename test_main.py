@@ -0,0 +1,63 @@
+# =========================================
+# Regression checks for the player server
+# Run with: pytest (needs pytest and httpx on top of requirements.txt)
+# =========================================
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+# Browser-looking user agents are rejected, so talk like a script
+HEADERS = {"user-agent": "python-requests/2"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app, headers=HEADERS) as c:
+        yield c
+
+
+def test_join_accepts_coords_beyond_64_bit(client):
+    body = {
+        "username": "bigint",
+        "level": "Level1",
+        "coords": {"x": 2 ** 70, "y": 0, "z": 0},
+        "frequency": 123.4
+    }
+    response = client.post("/join", json=body)
+    assert response.status_code == 200
+    assert response.json()["status"] == "new"
+
+    response = client.post("/join", json=body)
+    assert response.json()["status"] == "no_change"
+
+    players = client.get("/players").json()["players"]
+    assert players["bigint"]["coords"]["x"] == 2 ** 70
+
+
+def test_chat_get_survives_values_orjson_cannot_encode(client):
+    response = client.post(
+        "/chat/send",
+        json={"username": "bigint", "frequency": 2 ** 70, "message": "hi"}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/chat/get")
+    assert response.status_code == 200
+    messages = response.json()["messages"].values()
+    assert any(msg["frequency"] == 2 ** 70 for msg in messages)
+
+
+def test_removed_marker_releases_level_and_type(client):
+    marker_id = client.post("/markers/place", json={
+        "username": "leak",
+        "frequency": 1.5,
+        "level": "one-off-level",
+        "coords": {"x": 1},
+        "marker_type": "one-off-type"
+    }).json()["marker_id"]
+    client.delete(f"/markers/remove/{marker_id}")
+
+    assert "one-off-level" not in main.markers_by_level
+    assert "one-off-level" not in main.marker_level
+    assert "one-off-type" not in main.marker_types